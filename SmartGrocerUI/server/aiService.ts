@@ -1,4 +1,4 @@
-import { spawn } from 'child_process';
+import { spawn, type ChildProcessWithoutNullStreams } from 'child_process';
 import path from 'path';
 import { fileURLToPath } from 'url';
 
@@ -29,12 +29,100 @@ export class AIService {
   private pythonPath: string;
   private scriptPath: string;
   private substitutionRateCache = new Map<number, number>();
+  // Persistent --serve child: loads CSVs and builds the Kumo graph once,
+  // then answers newline-delimited JSON requests over stdin/stdout
+  private server: ChildProcessWithoutNullStreams | null = null;
+  private serverBuffer = '';
+  // FIFO of in-flight requests; responses pair with entries by arrival
+  // order, so entries must be removed whenever the server never saw
+  // (or can no longer answer) the request
+  private pendingRequests: Array<{
+    resolve: (line: string) => void;
+    reject: (error: Error) => void;
+  }> = [];
 
   constructor() {
     this.pythonPath = 'python'; // Use 'python' for Replit
     this.scriptPath = path.join(__dirname, '../python/kumo_predictions.py');
   }
 
+  private getServer(): ChildProcessWithoutNullStreams {
+    if (this.server) {
+      return this.server;
+    }
+
+    const options = {
+      cwd: path.join(__dirname, '..')
+    };
+    const server = spawn(this.pythonPath, [this.scriptPath, '--serve'], options);
+
+    // Drain stderr (Kumo SDK chatter and per-request logs end up there);
+    // an unconsumed pipe fills up and blocks the Python process
+    server.stderr.on('data', (data) => {
+      process.stderr.write(data);
+    });
+
+    server.stdout.on('data', (data) => {
+      this.serverBuffer += data.toString();
+      let newline;
+      while ((newline = this.serverBuffer.indexOf('\n')) >= 0) {
+        const line = this.serverBuffer.slice(0, newline);
+        this.serverBuffer = this.serverBuffer.slice(newline + 1);
+        const next = this.pendingRequests.shift();
+        if (next) {
+          next.resolve(line);
+        }
+      }
+    });
+
+    server.on('error', () => this.resetServer());
+    server.on('close', () => this.resetServer());
+
+    this.server = server;
+    return server;
+  }
+
+  private resetServer() {
+    this.server = null;
+    this.serverBuffer = '';
+    // Fail in-flight callers immediately so they fall back to one-shot
+    // spawns instead of waiting out the request timeout
+    const pending = this.pendingRequests;
+    this.pendingRequests = [];
+    for (const entry of pending) {
+      entry.reject(new Error('Kumo server exited'));
+    }
+  }
+
+  private requestViaServer(request: object): Promise<string> {
+    return new Promise((resolve, reject) => {
+      const server = this.getServer();
+      const timer = setTimeout(() => reject(new Error('Kumo server timed out')), 30000);
+      const entry = {
+        resolve: (line: string) => {
+          clearTimeout(timer);
+          resolve(line);
+        },
+        reject: (error: Error) => {
+          clearTimeout(timer);
+          reject(error);
+        }
+      };
+      this.pendingRequests.push(entry);
+      server.stdin.write(JSON.stringify(request) + '\n', (error) => {
+        if (error) {
+          // The server never received this request; drop its queue slot
+          // so later responses keep pairing with the right callers
+          const index = this.pendingRequests.indexOf(entry);
+          if (index >= 0) {
+            this.pendingRequests.splice(index, 1);
+          }
+          entry.reject(error);
+        }
+      });
+    });
+  }
+
   async predictCartItems(userId: number, numItems: number = 5): Promise<CartPrediction[]> {
     try {
       const result = await this.runPythonScript('cart', userId.toString(), numItems.toString());
@@ -65,6 +153,21 @@ export class AIService {
     }
   }
 
+  async predictAll(userId: number, timezone: string = 'UTC'): Promise<{
+    cart: CartPrediction[];
+    recommendations: ProductRecommendation[];
+    delivery_times: any[];
+  }> {
+    try {
+      // One round trip; the Python side runs the three predictions concurrently
+      const result = await this.runPythonScript('all', userId.toString(), '5', timezone);
+      return JSON.parse(result);
+    } catch (error) {
+      console.error('Error predicting all:', error);
+      return { cart: [], recommendations: [], delivery_times: [] };
+    }
+  }
+
   async getProductSubstitutionRate(productId: number): Promise<number> {
     try {
       // Check cache first
@@ -127,7 +230,27 @@ export class AIService {
     }
   }
 
-  private runPythonScript(command: string, userId: string, numItems: string, timezone?: string): Promise<string> {
+  private async runPythonScript(command: string, userId: string, numItems: string, timezone?: string): Promise<string> {
+    // Prefer the persistent server; fall back to a one-shot process
+    // (which reloads everything) when it is unavailable
+    try {
+      const request: any = { type: command };
+      if (command === 'substitution-rate') {
+        request.product_id = parseInt(userId);
+      } else if (command === 'batch-substitution-rates') {
+        request.product_ids = userId.split(',').map((id) => parseInt(id.trim()));
+      } else {
+        request.user_id = parseInt(userId);
+        request.num_items = parseInt(numItems);
+        if (timezone) {
+          request.timezone = timezone;
+        }
+      }
+      return await this.requestViaServer(request);
+    } catch (error) {
+      console.error('Kumo server request failed, spawning one-shot process:', error);
+    }
+
     return new Promise((resolve, reject) => {
       // Set the working directory to the project root so Python can find CSV files
       const options = {
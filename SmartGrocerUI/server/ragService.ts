@@ -1,7 +1,12 @@
 import fs from 'fs';
+import net from 'net';
 import path from 'path';
 import { spawn } from 'child_process';
 
+// Unix socket of the optional long-lived ranking daemon
+// (python/kumo_personalized_ingredients.py --daemon)
+const KUMO_DAEMON_SOCKET = '/tmp/smart_grocer.sock';
+
 interface Product {
   product_id: number;
   product_name: string;
@@ -188,8 +193,49 @@ export interface PersonalizedIngredient {
   options: PersonalizedProduct[];
 }
 
+// Ask the ranking daemon, if one is running, so we skip Python startup,
+// CSV loading and Kumo init on every request
+function rankViaDaemon(productIds: number[], userId: number): Promise<PersonalizedProduct[]> {
+  return new Promise((resolve, reject) => {
+    const socket = net.createConnection(KUMO_DAEMON_SOCKET);
+    let output = '';
+
+    socket.setTimeout(15000, () => {
+      socket.destroy();
+      reject(new Error('Kumo daemon timed out'));
+    });
+
+    socket.on('connect', () => {
+      socket.write(JSON.stringify({ product_ids: productIds, user_id: userId }) + '\n');
+    });
+
+    socket.on('data', (data) => {
+      output += data.toString();
+      if (output.endsWith('\n')) {
+        socket.end();
+      }
+    });
+
+    socket.on('end', () => {
+      try {
+        resolve(JSON.parse(output));
+      } catch (error) {
+        reject(error);
+      }
+    });
+
+    socket.on('error', reject);
+  });
+}
+
 // Create personalized Kumo graph for specific products
 async function createPersonalizedKumoGraph(productIds: number[], userId: number): Promise<PersonalizedProduct[]> {
+  try {
+    return await rankViaDaemon(productIds, userId);
+  } catch {
+    // No daemon running (or it failed); fall back to a one-shot process
+  }
+
   return new Promise((resolve, reject) => {
     const pythonProcess = spawn('python3', [
       'python/kumo_personalized_ingredients.py',
@@ -9,6 +9,7 @@ Requirements:
 - pandas
 - faker
 - openai
+- tenacity
 - Set OPENAI_API_KEY environment variable
 
 Usage:
@@ -16,23 +17,50 @@ Usage:
     python grocery_dataset_generator.py
 """
 
+import asyncio
 import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from faker import Faker
 import json
 import os
-import random
+import re
 from datetime import datetime, timedelta
-from openai import OpenAI
+from openai import AsyncOpenAI
+from tenacity import retry, stop_after_attempt, wait_exponential
+
+import llm_cache
+
+# Polars assembles and filters the string-heavy catalog much faster
+# than pandas object columns; fall back to pandas when not installed
+try:
+    import polars as pl
+    POLARS_AVAILABLE = True
+except ImportError:
+    POLARS_AVAILABLE = False
+
+# Arrow's multithreaded CSV writer serializes the output files much
+# faster than DataFrame.to_csv; fall back to pandas when not installed
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
 
 # Initialize Faker
 fake = Faker()
 Faker.seed(42)  # For reproducibility
-np.random.seed(42)
-random.seed(42)
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+# Single seeded generator for all module-level randomness; the PCG64
+# generator draws much faster than the legacy random module
+RNG = np.random.default_rng(42)
+
+# Initialize OpenAI client (async so category/batch requests can overlap)
+client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+
+# Maximum number of in-flight API requests
+API_CONCURRENCY = 10
 
 def generate_products_via_api(products_per_category=100, batch_size=30, similar_batch_pct=0.6, similar_subset_pct=0.4):
     """
@@ -50,69 +78,87 @@ def generate_products_via_api(products_per_category=100, batch_size=30, similar_
     print(f"Similar products: {similar_batch_pct*100:.0f}% of batch, {similar_subset_pct*100:.0f}% get variants")
     
     categories = ['Produce', 'Dairy', 'Bakery', 'Meat & Seafood', 'Pantry Staples', 'Snacks', 'Beverages', 'Household']
-    all_products = []
     substitution_map = {}  # Maps original product_id to list of similar product_ids
-    product_id_counter = 1
-    
-    for category in categories:
-        print(f"  Generating {products_per_category} products for category: {category}")
-        category_products = []
-        
-        # Generate products in batches
-        for batch_start in range(0, products_per_category, batch_size):
-            remaining_in_category = products_per_category - len(category_products)
-            current_batch_size = min(batch_size, remaining_in_category)
-            
-            if current_batch_size <= 0:
-                break
-            
-            print(f"    Batch {batch_start // batch_size + 1}: Generating {current_batch_size} products...")
-            
-            try:
-                # Generate base products first
-                base_products = generate_base_products_batch(category, current_batch_size, product_id_counter)
-                
-                if not base_products:
-                    continue
-                
-                # Add base products to our list
-                category_products.extend(base_products)
-                base_product_ids = [p['product_id'] for p in base_products]
-                product_id_counter += len(base_products)
-                
-                # Generate similar products
-                similar_products, new_substitution_map = generate_similar_products(
-                    base_products, 
-                    product_id_counter, 
-                    similar_batch_pct, 
-                    similar_subset_pct
-                )
-                
-                if similar_products:
-                    category_products.extend(similar_products)
-                    substitution_map.update(new_substitution_map)
-                    product_id_counter += len(similar_products)
-                    
-                    print(f"    Generated {len(base_products)} base + {len(similar_products)} similar products")
-                else:
-                    print(f"    Generated {len(base_products)} products")
-                
-            except Exception as e:
-                print(f"    Error in batch generation for {category}: {e}")
-                # Generate fallback products for this batch
-                fallback_products = generate_fallback_batch(category, current_batch_size, product_id_counter)
-                category_products.extend(fallback_products)
-                product_id_counter += len(fallback_products)
-        
-        all_products.extend(category_products)
-        print(f"  Completed {category}: {len(category_products)} total products generated")
-    
+
+    # Every category gets a fixed contiguous product_id block, so ids
+    # stay deterministic regardless of request completion order
+    category_base = {category: 1 + idx * products_per_category
+                     for idx, category in enumerate(categories)}
+    next_id = 1 + len(categories) * products_per_category
+
+    # Each round asks for one batch of every category in a single API
+    # request, so we pay one request slot for all eight categories
+    rounds = []
+    for batch_start in range(0, products_per_category, batch_size):
+        current_batch_size = min(batch_size, products_per_category - batch_start)
+        start_ids = {category: category_base[category] + batch_start
+                     for category in categories}
+        rounds.append((current_batch_size, start_ids))
+
+    # Fire the rounds concurrently; the semaphore caps in-flight
+    # requests, so total API wait time approaches the slowest round trip
+    async def run_rounds():
+        semaphore = asyncio.Semaphore(API_CONCURRENCY)
+        return await asyncio.gather(*[
+            generate_multi_category_batch(categories, size, start_ids, semaphore)
+            for size, start_ids in rounds
+        ])
+
+    print(f"  Requesting {len(rounds)} combined batches across {len(categories)} categories...")
+    round_results = asyncio.run(run_rounds())
+
+    # Similar-product generation is local CPU work; fan it out across
+    # processes after the network fan-in, one task per category batch.
+    # Workers emit batch-local variant ids which the parent rebases onto
+    # the global id sequence while merging in fixed batch order, so the
+    # catalog stays deterministic regardless of worker scheduling.
+    cells = []
+    for (size, start_ids), round_products in zip(rounds, round_results):
+        for category in categories:
+            base_products = round_products.get(category)
+            if base_products:
+                cells.append((category, base_products))
+
+    all_products = []
+    product_id_counter = next_id
+    with ProcessPoolExecutor() as executor:
+        futures = [
+            executor.submit(postprocess_category, base_products, cell_idx,
+                            similar_batch_pct, similar_subset_pct)
+            for cell_idx, (category, base_products) in enumerate(cells)
+        ]
+        for (category, base_products), future in zip(cells, futures):
+            similar_products, local_map = future.result()
+            all_products.extend(base_products)
+
+            if similar_products:
+                for similar_product in similar_products:
+                    similar_product['product_id'] += product_id_counter
+                for base_id, variant_ids in local_map.items():
+                    substitution_map[base_id] = [
+                        variant_id + product_id_counter for variant_id in variant_ids]
+                all_products.extend(similar_products)
+                product_id_counter += len(similar_products)
+
+                print(f"  {category}: {len(base_products)} base + {len(similar_products)} similar products")
+            else:
+                print(f"  {category}: {len(base_products)} products")
+
     # Create DataFrame
-    products_df = pd.DataFrame(all_products)
-    
-    # Reorder columns
     column_order = ['product_id', 'product_name', 'category', 'brand', 'size', 'unit', 'price_per_unit']
-    products_df = products_df[column_order]
+    if POLARS_AVAILABLE:
+        # Arrow-backed assembly of the product dicts, back to pandas at
+        # the boundary for the downstream consumers
+        products_df = pl.from_dicts(all_products).select(column_order).to_pandas()
+    else:
+        # Build the frame in the target column order directly instead of
+        # constructing every key and then copying via a column selection
+        products_df = pd.DataFrame(all_products, columns=column_order)
+
+    # Dictionary-encode the low-cardinality string columns; groupby and
+    # equality in downstream consumers then work on int codes
+    products_df = products_df.astype(
+        {'category': 'category', 'brand': 'category', 'unit': 'category'})
     
     # Store substitution map globally for use in order_items generation
     global SUBSTITUTION_MAP
@@ -121,70 +167,94 @@ def generate_products_via_api(products_per_category=100, batch_size=30, similar_
     print(f"Successfully generated {len(products_df)} total products with {len(substitution_map)} substitution groups")
     return products_df
 
-def generate_base_products_batch(category, batch_size, start_id):
+# Strict schema for a single-category batch: the model must return a
+# {"products": [...]} object, so no recovery parsing is needed client-side
+_PRODUCT_BATCH_SCHEMA = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "product_batch",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "products": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "product_name": {"type": "string"},
+                            "brand": {"type": "string"},
+                            "size": {"type": "string"},
+                            "unit": {"type": "string"},
+                            "price_per_unit": {"type": "number"}
+                        },
+                        "required": ["product_name", "brand", "size",
+                                     "unit", "price_per_unit"],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["products"],
+            "additionalProperties": False
+        }
+    }
+}
+
+@retry(stop=stop_after_attempt(3),
+       wait=wait_exponential(multiplier=1, max=10),
+       reraise=True)
+async def _request_products_batch(category, batch_size):
     """
-    Generate base products for a category using OpenAI API
+    Issue one product-batch completion request, retrying transient
+    failures (rate limits, network errors) with exponential backoff
     """
-    try:
-        # Create structured output schema
-        response = client.chat.completions.create(
+    return await client.chat.completions.create(
             model="gpt-4.1-nano",
             messages=[
                 {
-                    "role": "system", 
-                    "content": "You are a helpful assistant that generates realistic grocery store product data. Always respond with valid JSON only."
+                    "role": "system",
+                    "content": "You are a helpful assistant that generates realistic grocery store product data."
                 },
                 {
                     "role": "user",
                     "content": f"""Generate exactly {batch_size} realistic grocery store products for the category "{category}".
 
-IMPORTANT: Your response must be ONLY a valid JSON array. Do not include any text outside the JSON.
-
-Each product object must have these exact keys:
+Each product needs:
 - "product_name": A realistic product name (string)
-- "brand": A realistic brand name (string) 
+- "brand": A realistic brand name (string)
 - "size": Product size with number (string, e.g., "16 oz", "1 lb", "500g")
 - "unit": Unit of measurement (string, e.g., "oz", "lb", "g", "ml", "count", "each")
 - "price_per_unit": Price per unit as a decimal number (float, e.g., 3.99, 12.50)
 
-Make products diverse and realistic for the {category} category. Ensure price_per_unit reflects realistic grocery store prices.
-
-Example format:
-[
-  {{"product_name": "Fresh Organic Bananas", "brand": "Whole Foods", "size": "1 lb", "unit": "lb", "price_per_unit": 1.99}},
-  {{"product_name": "Honeycrisp Apples", "brand": "Local Farm", "size": "3 lb", "unit": "lb", "price_per_unit": 4.99}}
-]"""
+Make products diverse and realistic for the {category} category. Ensure price_per_unit reflects realistic grocery store prices."""
                 }
             ],
             max_tokens=2000,
             temperature=0.7,
-            response_format={"type": "json_object"}
+            response_format=_PRODUCT_BATCH_SCHEMA
         )
-        
-        # Parse the JSON response
-        content = response.choices[0].message.content.strip()
-        
-        # Handle the case where the model might wrap the array in an object
-        try:
-            parsed_content = json.loads(content)
-            if isinstance(parsed_content, dict) and 'products' in parsed_content:
-                batch_products = parsed_content['products']
-            elif isinstance(parsed_content, dict) and len(parsed_content) == 1:
-                # If it's a dict with one key, try to extract the array value
-                batch_products = list(parsed_content.values())[0]
-            elif isinstance(parsed_content, list):
-                batch_products = parsed_content
-            else:
-                raise ValueError("Unexpected JSON structure")
-        except json.JSONDecodeError:
-            # Try to extract JSON array from the content
-            if '[' in content and ']' in content:
-                start = content.find('[')
-                end = content.rfind(']') + 1
-                batch_products = json.loads(content[start:end])
-            else:
-                raise
-        
+
+
+async def generate_base_products_batch(category, batch_size, start_id, semaphore):
+    """
+    Generate base products for a category using OpenAI API
+    """
+    try:
+        # Identical (category, batch) prompts hit the on-disk cache on
+        # reruns instead of the API
+        cache_key = llm_cache.make_key(model="gpt-4.1-nano", category=category,
+                                       n=batch_size, seq=start_id, prompt_v=2)
+        content = llm_cache.get(cache_key)
+        if content is None:
+            async with semaphore:
+                response = await _request_products_batch(category, batch_size)
+            content = response.choices[0].message.content.strip()
+            llm_cache.set(cache_key, content)
+
+        # The strict response schema guarantees a {"products": [...]}
+        # object, so anything else is a hard failure for the except path
+        batch_products = json.loads(content)['products']
+
         # Validate and add products
         valid_products = []
         for i, product in enumerate(batch_products):
@@ -199,7 +269,106 @@ Example format:
         print(f"    API call failed: {e}")
         return generate_fallback_batch(category, batch_size, start_id)
 
-def generate_similar_products(base_products, start_id, similar_batch_pct, similar_subset_pct):
+@retry(stop=stop_after_attempt(3),
+       wait=wait_exponential(multiplier=1, max=10),
+       reraise=True)
+async def _request_multi_category_batch(categories, batch_size):
+    """
+    Ask for one batch of every category in a single completion request,
+    returned as a JSON object keyed by category name
+    """
+    category_list = ', '.join(f'"{c}"' for c in categories)
+    return await client.chat.completions.create(
+        model="gpt-4.1-nano",
+        messages=[
+            {
+                "role": "system",
+                "content": "You are a helpful assistant that generates realistic grocery store product data. Always respond with valid JSON only."
+            },
+            {
+                "role": "user",
+                "content": f"""Generate exactly {batch_size} realistic grocery store products for EACH of these categories: {category_list}.
+
+IMPORTANT: Your response must be ONLY a valid JSON object with one key per category name, each mapping to an array of {batch_size} products.
+
+Each product object must have these exact keys:
+- "product_name": A realistic product name (string)
+- "brand": A realistic brand name (string)
+- "size": Product size with number (string, e.g., "16 oz", "1 lb", "500g")
+- "unit": Unit of measurement (string, e.g., "oz", "lb", "g", "ml", "count", "each")
+- "price_per_unit": Price per unit as a decimal number (float, e.g., 3.99, 12.50)
+
+Make products diverse and realistic for each category. Ensure price_per_unit reflects realistic grocery store prices.
+
+Example format:
+{{
+  "Produce": [{{"product_name": "Fresh Organic Bananas", "brand": "Whole Foods", "size": "1 lb", "unit": "lb", "price_per_unit": 1.99}}],
+  "Dairy": [{{"product_name": "Whole Milk", "brand": "Horizon", "size": "1 gallon", "unit": "gallon", "price_per_unit": 4.49}}]
+}}"""
+            }
+        ],
+        # One request now carries every category, so scale the budget
+        max_tokens=2000 * len(categories),
+        temperature=0.7,
+        response_format={"type": "json_object"}
+    )
+
+
+async def generate_multi_category_batch(categories, batch_size, start_ids, semaphore):
+    """
+    Generate one batch of products for all categories in a single API
+    request. Falls back to per-category requests when the combined
+    response does not match the expected category-keyed schema.
+    """
+    try:
+        # Reruns of the same combined round are served from the on-disk
+        # cache without touching the network
+        cache_key = llm_cache.make_key(model="gpt-4.1-nano",
+                                       categories=list(categories),
+                                       n=batch_size,
+                                       seq=min(start_ids.values()),
+                                       prompt_v=1)
+        content = llm_cache.get(cache_key)
+        if content is None:
+            async with semaphore:
+                response = await _request_multi_category_batch(categories, batch_size)
+            content = response.choices[0].message.content.strip()
+            llm_cache.set(cache_key, content)
+
+        parsed = json.loads(content)
+        if not isinstance(parsed, dict):
+            raise ValueError("Expected a category-keyed JSON object")
+
+        results = {}
+        for category in categories:
+            batch_products = parsed.get(category)
+            if not isinstance(batch_products, list) or not batch_products:
+                raise ValueError(f"Missing products for category {category}")
+
+            valid_products = []
+            for i, product in enumerate(batch_products):
+                if all(key in product for key in ['product_name', 'brand', 'size', 'unit', 'price_per_unit']):
+                    product['category'] = category
+                    product['product_id'] = start_ids[category] + i
+                    valid_products.append(product)
+
+            if not valid_products:
+                raise ValueError(f"No valid products for category {category}")
+            results[category] = valid_products[:batch_size]
+
+        return results
+
+    except Exception as e:
+        print(f"    Combined batch failed ({e}); retrying per category")
+        per_category = await asyncio.gather(*[
+            generate_base_products_batch(category, batch_size,
+                                         start_ids[category], semaphore)
+            for category in categories
+        ])
+        return dict(zip(categories, per_category))
+
+
+def generate_similar_products(base_products, start_id, similar_batch_pct, similar_subset_pct, rng=None):
     """
     Generate similar products based on base products
     
@@ -208,32 +377,45 @@ def generate_similar_products(base_products, start_id, similar_batch_pct, simila
         start_id: Starting product ID for similar products
         similar_batch_pct: Percentage of batch to select for similarity
         similar_subset_pct: Percentage of selected products to create variants for
-    
+        rng: Generator to draw from; defaults to the module RNG
+
     Returns:
         Tuple of (similar_products_list, substitution_map)
     """
     if not base_products:
         return [], {}
+    if rng is None:
+        rng = RNG
     
     # Step 1: Select products from batch based on similar_batch_pct
     batch_selection_count = max(1, int(len(base_products) * similar_batch_pct))
-    selected_for_similarity = random.sample(base_products, min(batch_selection_count, len(base_products)))
-    
+    selected_for_similarity = [
+        base_products[i] for i in rng.choice(
+            len(base_products),
+            size=min(batch_selection_count, len(base_products)),
+            replace=False)
+    ]
+
     # Step 2: From selected products, choose which ones get similar variants
     variant_count = max(1, int(len(selected_for_similarity) * similar_subset_pct))
-    products_getting_variants = random.sample(selected_for_similarity, min(variant_count, len(selected_for_similarity)))
-    
+    products_getting_variants = [
+        selected_for_similarity[i] for i in rng.choice(
+            len(selected_for_similarity),
+            size=min(variant_count, len(selected_for_similarity)),
+            replace=False)
+    ]
+
     similar_products = []
     substitution_map = {}
     current_id = start_id
-    
+
     for base_product in products_getting_variants:
         # Create 1-2 similar variants per selected product
-        num_variants = random.choice([1, 2])
+        num_variants = int(rng.integers(1, 3))
         variant_ids = []
-        
+
         for _ in range(num_variants):
-            similar_product = create_similar_product(base_product, current_id)
+            similar_product = create_similar_product(base_product, current_id, rng)
             similar_products.append(similar_product)
             variant_ids.append(current_id)
             current_id += 1
@@ -243,18 +425,35 @@ def generate_similar_products(base_products, start_id, similar_batch_pct, simila
     
     return similar_products, substitution_map
 
-def create_similar_product(base_product, new_id):
+def postprocess_category(base_products, seed, similar_batch_pct, similar_subset_pct):
+    """
+    Worker-side post-processing for one category batch: build the
+    similar-product variants with ids local to the batch (0-based).
+    Reseeding from the batch index keeps the draws reproducible and
+    independent of which pool process picks up the task.
+    """
+    rng = np.random.default_rng(seed)
+    return generate_similar_products(
+        base_products, 0, similar_batch_pct, similar_subset_pct, rng)
+
+# Leading amount and remaining unit text of a size string like "3.5 lbs",
+# compiled once instead of split/isdigit/float per generated variant
+_SIZE_RE = re.compile(r'^\s*([0-9]+(?:\.[0-9]+)?)\s+(.*)')
+
+def create_similar_product(base_product, new_id, rng=None):
     """
     Create a similar product by slightly modifying the base product
     """
+    if rng is None:
+        rng = RNG
     similar_product = base_product.copy()
     similar_product['product_id'] = new_id
-    
+
     # Modify different aspects randomly
     modifications = []
-    
+
     # 70% chance to modify brand
-    if random.random() < 0.7:
+    if rng.random() < 0.7:
         brand_variants = {
             'Whole Foods': ['365 Everyday Value', 'Whole Foods Market'],
             'Great Value': ['Walmart', 'Equate'],
@@ -265,47 +464,47 @@ def create_similar_product(base_product, new_id):
         
         current_brand = similar_product['brand']
         if current_brand in brand_variants:
-            similar_product['brand'] = random.choice(brand_variants[current_brand])
+            variants = brand_variants[current_brand]
         else:
             # Generic brand alternatives
-            generic_brands = ['Store Brand', 'Value Brand', 'Premium Choice', 'Fresh Select']
-            similar_product['brand'] = random.choice(generic_brands)
+            variants = ['Store Brand', 'Value Brand', 'Premium Choice', 'Fresh Select']
+        similar_product['brand'] = variants[rng.integers(0, len(variants))]
         modifications.append('brand')
-    
+
     # 60% chance to modify size
-    if random.random() < 0.6:
+    if rng.random() < 0.6:
         current_size = similar_product['size']
         unit = similar_product['unit']
         
         # Extract number from size
-        size_parts = current_size.split()
-        if size_parts and size_parts[0].replace('.', '').isdigit():
-            current_amount = float(size_parts[0])
-            
+        size_match = _SIZE_RE.match(current_size)
+        if size_match:
+            current_amount = float(size_match.group(1))
+
             # Vary size by ±20-50%
-            variation_factor = random.uniform(0.8, 1.5)
+            variation_factor = rng.uniform(0.8, 1.5)
             new_amount = round(current_amount * variation_factor, 1)
-            
+
             # Keep it reasonable
             if new_amount > 0.1:
-                similar_product['size'] = f"{new_amount} {' '.join(size_parts[1:])}"
+                similar_product['size'] = f"{new_amount} {size_match.group(2)}"
                 modifications.append('size')
     
     # 80% chance to modify price (usually within ±30%)
-    if random.random() < 0.8:
+    if rng.random() < 0.8:
         current_price = similar_product['price_per_unit']
-        price_variation = random.uniform(0.7, 1.3)
+        price_variation = rng.uniform(0.7, 1.3)
         new_price = round(current_price * price_variation, 2)
         similar_product['price_per_unit'] = max(0.99, new_price)  # Minimum price
         modifications.append('price')
     
     # 30% chance to slightly modify product name
-    if random.random() < 0.3:
+    if rng.random() < 0.3:
         name_modifiers = ['Premium', 'Organic', 'Natural', 'Fresh', 'Classic', 'Original', 'Extra']
         current_name = similar_product['product_name']
-        
+
         # Add a modifier if it's not already there
-        modifier = random.choice(name_modifiers)
+        modifier = name_modifiers[rng.integers(0, len(name_modifiers))]
         if modifier.lower() not in current_name.lower():
             similar_product['product_name'] = f"{modifier} {current_name}"
             modifications.append('name')
@@ -329,7 +528,8 @@ def generate_fallback_batch(category, batch_size, start_id):
     
     products = []
     for i in range(batch_size):
-        brand = random.choice(brands.get(category, ['Generic Brand']))
+        brand_options = brands.get(category, ['Generic Brand'])
+        brand = brand_options[RNG.integers(0, len(brand_options))]
         
         if category == 'Produce':
             items = ['Apples', 'Bananas', 'Carrots', 'Lettuce', 'Tomatoes', 'Potatoes', 'Onions']
@@ -339,7 +539,7 @@ def generate_fallback_batch(category, batch_size, start_id):
         elif category == 'Dairy':
             items = ['Milk', 'Cheese', 'Yogurt', 'Butter', 'Eggs', 'Cream']
             size_options = ['16 oz', '32 oz', '1 gallon', '12 count']
-            unit = random.choice(['oz', 'gallon', 'count'])
+            unit = ('oz', 'gallon', 'count')[RNG.integers(0, 3)]
             price_range = (2.0, 8.0)
         else:
             items = [fake.word().title() for _ in range(10)]
@@ -347,9 +547,9 @@ def generate_fallback_batch(category, batch_size, start_id):
             unit = 'oz'
             price_range = (1.5, 12.0)
         
-        name = random.choice(items)
-        size = random.choice(size_options)
-        
+        name = items[RNG.integers(0, len(items))]
+        size = size_options[RNG.integers(0, len(size_options))]
+
         products.append({
             'product_id': start_id + i,
             'product_name': f"{brand} {name}",
@@ -357,7 +557,7 @@ def generate_fallback_batch(category, batch_size, start_id):
             'brand': brand,
             'size': size,
             'unit': unit,
-            'price_per_unit': round(random.uniform(*price_range), 2)
+            'price_per_unit': round(float(RNG.uniform(*price_range)), 2)
         })
     
     return products
@@ -378,77 +578,120 @@ def generate_fallback_products(products_per_category=100):
     
     return pd.DataFrame(all_products)
 
-def generate_users():
+def generate_users(num_users=100):
     """Generate users dataset"""
     print("Generating users...")
-    
-    users = []
+
     dietary_preferences = ['none', 'vegetarian', 'gluten-free', 'vegan']
     shopping_days = ['Saturday', 'Sunday', 'Monday', 'Wednesday']
-    
-    for i in range(1, 101):  # 100 users
-        users.append({
-            'user_id': i,
-            'household_size': random.randint(1, 5),
-            'dietary_preference': random.choice(dietary_preferences),
-            'primary_shopping_day': random.choice(shopping_days)
-        })
-    
-    return pd.DataFrame(users)
 
-def generate_orders(users_df):
+    # One vectorized draw per column instead of a Python loop per user
+    rng = np.random.default_rng(42)
+    return pd.DataFrame({
+        'user_id': np.arange(1, num_users + 1),
+        'household_size': rng.integers(1, 6, num_users),
+        'dietary_preference': pd.Categorical(
+            rng.choice(dietary_preferences, num_users)),
+        'primary_shopping_day': pd.Categorical(
+            rng.choice(shopping_days, num_users))
+    })
+
+def generate_orders(users_df, num_orders=2000):
     """Generate orders dataset"""
     print("Generating orders...")
-    
-    orders = []
+
     delivery_methods = ['pickup', 'delivery']
     time_windows = ['9am-11am', '11am-1pm', '3pm-5pm', '5pm-7pm']
-    
+
     # Map day names to weekday numbers
     day_mapping = {
         'Monday': 0, 'Tuesday': 1, 'Wednesday': 2, 'Thursday': 3,
         'Friday': 4, 'Saturday': 5, 'Sunday': 6
     }
-    
+
     # Generate orders over the last 2 years
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=730)
-    
-    for order_id in range(1, 2001):  # 2,000 orders
-        user_id = random.randint(1, 100)
-        user = users_df[users_df['user_id'] == user_id].iloc[0]
-        preferred_day = user['primary_shopping_day']
-        preferred_weekday = day_mapping[preferred_day]
-        
-        # Generate timestamp clustered around user's preferred shopping day
-        if random.random() < 0.7:  # 70% chance on preferred day
-            # Find a date that matches the preferred weekday
-            random_date = fake.date_time_between(start_date=start_date, end_date=end_date)
-            days_ahead = (preferred_weekday - random_date.weekday()) % 7
-            if days_ahead == 0:
-                target_date = random_date
-            else:
-                target_date = random_date + timedelta(days=days_ahead)
-        else:
-            # Random day
-            target_date = fake.date_time_between(start_date=start_date, end_date=end_date)
-        
-        orders.append({
-            'order_id': order_id,
-            'user_id': user_id,
-            'order_timestamp': target_date,
-            'delivery_method': random.choice(delivery_methods),
-            'delivery_window': random.choice(time_windows)
-        })
-    
-    return pd.DataFrame(orders)
+    start_date = datetime.now() - timedelta(days=730)
+
+    rng = np.random.default_rng(42)
+    user_ids = rng.integers(1, len(users_df) + 1, num_orders)
+
+    # user_ids are contiguous from 1, so each order's preferred weekday
+    # is a direct array index instead of a boolean scan of users_df
+    preferred_weekday = users_df['primary_shopping_day'].map(
+        day_mapping).to_numpy()[user_ids - 1]
+
+    # Random timestamps across the window at second resolution
+    timestamps = (np.datetime64(start_date, 's')
+                  + rng.integers(0, 730 * 86400, num_orders).astype('timedelta64[s]'))
+
+    # Cluster 70% of orders onto the user's preferred shopping day by
+    # shifting them forward to the next matching weekday (the epoch,
+    # 1970-01-01, was a Thursday: weekday 3)
+    weekday = (timestamps.astype('datetime64[D]').astype('int64') + 3) % 7
+    days_ahead = (preferred_weekday - weekday) % 7
+    clustered = rng.random(num_orders) < 0.7
+    timestamps = timestamps + np.where(clustered, days_ahead, 0).astype('timedelta64[D]')
+
+    return pd.DataFrame({
+        'order_id': np.arange(1, num_orders + 1),
+        'user_id': user_ids,
+        'order_timestamp': timestamps,
+        'delivery_method': pd.Categorical(
+            rng.choice(delivery_methods, num_orders)),
+        'delivery_window': pd.Categorical(
+            rng.choice(time_windows, num_orders))
+    })
+
+def _create_product_affinities_polars(products):
+    """
+    Polars implementation of create_product_affinities; the keyword
+    masks run on Arrow-backed string kernels
+    """
+    affinity_groups = {}
+    lowered = products.with_columns(
+        pl.col('product_name').str.to_lowercase().alias('_name_lower'))
+
+    def contains_ids(group, keyword):
+        return group.filter(
+            pl.col('_name_lower').str.contains(keyword, literal=True)
+        ).get_column('product_id').to_list()
+
+    # maintain_order keeps the group (and thus affinity-dict) order
+    # stable across runs; hash-group order would otherwise vary and
+    # shift the seeded draws in generate_order_items
+    for (category,), group in lowered.group_by(['category'], maintain_order=True):
+        category_products = group.get_column('product_id').to_list()
+
+        if category == 'Pantry Staples':
+            # Pasta sauce goes with pasta, etc.
+            affinity_groups['pasta_meal'] = (contains_ids(group, 'pasta')
+                                             + contains_ids(group, 'sauce'))
+
+        elif category == 'Dairy':
+            # Milk goes with cereal, cheese with crackers
+            affinity_groups['breakfast'] = contains_ids(group, 'milk')
+            affinity_groups['snacks'] = contains_ids(group, 'cheese')
+
+        elif category == 'Produce':
+            # Fruits and vegetables often bought together
+            affinity_groups['healthy'] = category_products
+
+        elif category == 'Snacks':
+            # Snacks often bought together
+            affinity_groups['snack_time'] = category_products
+
+    return affinity_groups
+
 
 def create_product_affinities(products_df):
     """
     Create product affinity groups for realistic shopping baskets
     """
+    if POLARS_AVAILABLE:
+        return _create_product_affinities_polars(pl.from_pandas(products_df))
+
     affinity_groups = {}
-    
+
     # Group products by category for easier affinity mapping
     by_category = products_df.groupby('category')
     
@@ -456,17 +699,20 @@ def create_product_affinities(products_df):
         category_products = group['product_id'].tolist()
         
         if category == 'Pantry Staples':
-            # Pasta sauce goes with pasta, etc.
-            pasta_products = [p for p in group['product_id'] if 'pasta' in group[group['product_id'] == p]['product_name'].iloc[0].lower()]
-            sauce_products = [p for p in group['product_id'] if 'sauce' in group[group['product_id'] == p]['product_name'].iloc[0].lower()]
-            
+            # Pasta sauce goes with pasta, etc. One substring mask over
+            # the group replaces the per-product re-filtering scans
+            names = group['product_name'].str.lower()
+            pasta_products = group.loc[names.str.contains('pasta', regex=False), 'product_id'].tolist()
+            sauce_products = group.loc[names.str.contains('sauce', regex=False), 'product_id'].tolist()
+
             affinity_groups['pasta_meal'] = pasta_products + sauce_products
-        
+
         elif category == 'Dairy':
             # Milk goes with cereal, cheese with crackers
-            milk_products = [p for p in group['product_id'] if 'milk' in group[group['product_id'] == p]['product_name'].iloc[0].lower()]
-            cheese_products = [p for p in group['product_id'] if 'cheese' in group[group['product_id'] == p]['product_name'].iloc[0].lower()]
-            
+            names = group['product_name'].str.lower()
+            milk_products = group.loc[names.str.contains('milk', regex=False), 'product_id'].tolist()
+            cheese_products = group.loc[names.str.contains('cheese', regex=False), 'product_id'].tolist()
+
             affinity_groups['breakfast'] = milk_products
             affinity_groups['snacks'] = cheese_products
         
@@ -480,97 +726,151 @@ def create_product_affinities(products_df):
     
     return affinity_groups
 
-def generate_order_items(orders_df, products_df, users_df):
+def generate_order_items(orders_df, products_df, users_df, substitution_map=None):
     """
     Generate order items with realistic purchasing patterns and affinities
     Now uses substitution map for realistic substitutions
     """
     print("Generating order items with purchasing affinities and smart substitutions...")
     
-    order_items = []
     affinity_groups = create_product_affinities(products_df)
-    
-    # Get global substitution map
-    global SUBSTITUTION_MAP
-    substitution_map = globals().get('SUBSTITUTION_MAP', {})
-    
-    for _, order in orders_df.iterrows():
-        order_id = order['order_id']
-        user_id = order['user_id']
-        
+
+    # Pair each group's id array (kept for sampling) with a set so the
+    # per-basket overlap test is one isdisjoint instead of a linear scan
+    affinity_pairs = [(np.asarray(group_products), set(group_products))
+                      for group_products in affinity_groups.values()]
+
+    # Preallocate typed columns at the 25-items-per-order upper bound and
+    # fill by index; 30k+ small dicts plus a dict-of-dicts DataFrame
+    # build were pure allocator overhead
+    max_items = len(orders_df) * 25
+    order_id_col = np.empty(max_items, np.int32)
+    product_id_col = np.empty(max_items, np.int32)
+    quantity_col = np.empty(max_items, np.int8)
+    was_substituted_col = np.empty(max_items, bool)
+    n_items = 0
+
+    if substitution_map is None:
+        substitution_map = globals().get('SUBSTITUTION_MAP', {})
+    # Arrays support the single .get probe and integer indexing below;
+    # empty variant lists are dropped so presence implies a valid draw
+    sub_arrays = {product_id: np.asarray(variants, dtype=np.int32)
+                  for product_id, variants in substitution_map.items()
+                  if variants}
+
+    # Index users and product categories once; the loops below then do
+    # dict lookups instead of boolean-scanning a frame per order/item
+    user_map = users_df.set_index('user_id')[
+        ['household_size', 'dietary_preference']].to_dict('index')
+    prod_cat = products_df.set_index('product_id')['category'].to_dict()
+    unique_name_ids = products_df.drop_duplicates('product_name')['product_id'].to_numpy()
+    all_product_ids = products_df['product_id'].to_numpy()
+    rng = np.random.default_rng(42)
+
+    # Draw the per-order and per-item randomness up front in three bulk
+    # calls; the loops below index into these instead of paying a
+    # generator call per decision
+    num_orders = len(orders_df)
+    base_basket = rng.integers(5, 16, num_orders)
+    qty_coin = rng.random((num_orders, 25, 2))
+    sub_coin = rng.random((num_orders, 25))
+
+    # zip over the two numpy columns we need rather than having iterrows
+    # build a Series per order row
+    for order_idx, (order_id, user_id) in enumerate(
+            zip(orders_df['order_id'].to_numpy(),
+                orders_df['user_id'].to_numpy())):
         # Get user info for household size influence
-        user_info = users_df[users_df['user_id'] == user_id].iloc[0]
+        user_info = user_map[user_id]
         household_size = user_info['household_size']
         dietary_preference = user_info['dietary_preference']
         
         # Determine basket size (5-25 items, influenced by household size)
-        base_basket_size = random.randint(5, 15)
+        base_basket_size = base_basket[order_idx]
         household_multiplier = 1 + (household_size - 1) * 0.3
         basket_size = int(base_basket_size * household_multiplier)
         basket_size = min(basket_size, 25)  # Cap at 25
         
         selected_products = set()
         
-        # Start with some random products
-        random_products = random.sample(
-            products_df.drop_duplicates('product_name')['product_id'].tolist(), 
-            min(basket_size // 2, len(products_df))
+        # Start with some random products, sampled without replacement
+        # straight from the cached id array
+        random_products = rng.choice(
+            unique_name_ids,
+            size=min(basket_size // 2, len(unique_name_ids)),
+            replace=False
         )
-        selected_products.update(random_products)
+        selected_products.update(random_products.tolist())
         
         # Add products based on affinities
-        for group_name, group_products in affinity_groups.items():
-            if any(p in selected_products for p in group_products):
+        for group_products, group_set in affinity_pairs:
+            if not selected_products.isdisjoint(group_set):
                 # If we already have a product from this group, add more from the same group
-                additional = random.sample(
-                    group_products, 
-                    min(random.randint(1, 3), len(group_products)))
-                selected_products.update(additional)
+                additional = rng.choice(
+                    group_products,
+                    size=min(rng.integers(1, 4), len(group_products)),
+                    replace=False)
+                selected_products.update(additional.tolist())
         
-        # Ensure we have enough products
+        # Ensure we have enough products; set-difference on the cached
+        # array replaces the per-order list comprehension over all ids
         while len(selected_products) < basket_size:
             remaining = basket_size - len(selected_products)
-            additional = random.sample(
-                [p for p in products_df['product_id'].tolist() if p not in selected_products],
-                min(remaining, len(products_df) - len(selected_products))
+            candidates = np.setdiff1d(
+                all_product_ids,
+                np.fromiter(selected_products, dtype=np.int64),
+                assume_unique=True
             )
-            selected_products.update(additional)
+            if candidates.size == 0:
+                break
+            additional = rng.choice(
+                candidates, size=min(remaining, candidates.size), replace=False)
+            selected_products.update(additional.tolist())
         
         # Trim to exact basket size
         selected_products = list(selected_products)[:basket_size]
         
         # Generate order items with smart substitutions
-        for product_id in selected_products:
+        for item_idx, product_id in enumerate(selected_products):
             # Quantity influenced by household size
             base_quantity = 1
             if household_size > 2:
-                if random.random() < 0.4:  # 40% chance for larger quantities
-                    base_quantity = random.randint(2, household_size)
-            
+                if qty_coin[order_idx, item_idx, 0] < 0.4:  # 40% chance for larger quantities
+                    base_quantity = rng.integers(2, household_size + 1)
+
             # Some products naturally have higher quantities (like produce)
-            product_info = products_df[products_df['product_id'] == product_id].iloc[0]
-            if product_info['category'] in ['Produce', 'Snacks']:
-                if random.random() < 0.3:
-                    base_quantity += random.randint(1, 2)
-            
+            if prod_cat[product_id] in ['Produce', 'Snacks']:
+                if qty_coin[order_idx, item_idx, 1] < 0.3:
+                    base_quantity += rng.integers(1, 3)
+
             # Determine substitution - use substitution map if available
             was_substituted = False
-            if random.random() < 0.1:  # 10% substitution rate
-                if product_id in substitution_map and substitution_map[product_id]:
+            if sub_coin[order_idx, item_idx] < 0.1:  # 10% substitution rate
+                variants = sub_arrays.get(product_id)
+                if variants is not None:
                     # Smart substitution: replace with similar product
-                    substitute_id = random.choice(substitution_map[product_id])
-                    # Update the product_id to the substitute
-                    product_id = substitute_id
+                    product_id = variants[rng.integers(0, len(variants))]
                 was_substituted = True
             
-            order_items.append({
-                'order_id': order_id,
-                'product_id': product_id,
-                'quantity': base_quantity,
-                'was_substituted': was_substituted
-            })
-    
-    return pd.DataFrame(order_items)
+            order_id_col[n_items] = order_id
+            product_id_col[n_items] = product_id
+            quantity_col[n_items] = base_quantity
+            was_substituted_col[n_items] = was_substituted
+            n_items += 1
+
+    return pd.DataFrame({
+        'order_id': order_id_col[:n_items],
+        'product_id': product_id_col[:n_items],
+        'quantity': quantity_col[:n_items],
+        'was_substituted': was_substituted_col[:n_items]
+    })
+
+def save_csv(df, path):
+    """Write a DataFrame to CSV via Arrow when available, else pandas"""
+    if PYARROW_AVAILABLE:
+        pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), path)
+    else:
+        df.to_csv(path, index=False)
 
 def main():
     """Main function to generate all datasets"""
@@ -597,22 +897,23 @@ def main():
     users_df = generate_users()
     products_df = generate_products_via_api(PRODUCTS_PER_CATEGORY, BATCH_SIZE, SIMILAR_BATCH_PCT, SIMILAR_SUBSET_PCT)
     orders_df = generate_orders(users_df)
-    order_items_df = generate_order_items(orders_df, products_df, users_df)
+    order_items_df = generate_order_items(
+        orders_df, products_df, users_df, globals().get('SUBSTITUTION_MAP', {}))
     
     # Save to CSV files
     print("Saving datasets to CSV files...")
-    users_df.to_csv('users.csv', index=False)
-    products_df.to_csv('products.csv', index=False)
-    orders_df.to_csv('orders.csv', index=False)
-    order_items_df.to_csv('order_items.csv', index=False)
-    
+    save_csv(users_df, 'users.csv')
+    save_csv(products_df, 'products.csv')
+    save_csv(orders_df, 'orders.csv')
+    save_csv(order_items_df, 'order_items.csv')
+
     # Print summary statistics
     print("\n=== Dataset Generation Complete ===")
     print(f"Users: {len(users_df)} records")
     print(f"Products: {len(products_df)} records ({PRODUCTS_PER_CATEGORY} per category)")
     print(f"Orders: {len(orders_df)} records")
     print(f"Order Items: {len(order_items_df)} records")
-    
+
     # Get global substitution map for reporting
     global SUBSTITUTION_MAP
     substitution_map = globals().get('SUBSTITUTION_MAP', {})
@@ -635,35 +936,7 @@ def main():
     
     print("\nFiles generated:")
     print("- users.csv")
-    print("- products.csv") 
-    print("- orders.csv")
-    print("- order_items.csv")
-    
-    # Save to CSV files
-    print("Saving datasets to CSV files...")
-    users_df.to_csv('users.csv', index=False)
-    products_df.to_csv('products.csv', index=False)
-    orders_df.to_csv('orders.csv', index=False)
-    order_items_df.to_csv('order_items.csv', index=False)
-    
-    # Print summary statistics
-    print("\n=== Dataset Generation Complete ===")
-    print(f"Users: {len(users_df)} records")
-    print(f"Products: {len(products_df)} records ({PRODUCTS_PER_CATEGORY} per category)")
-    print(f"Orders: {len(orders_df)} records")
-    print(f"Order Items: {len(order_items_df)} records")
-    
-    print(f"\nAverage items per order: {len(order_items_df) / len(orders_df):.1f}")
-    print(f"Product category distribution:")
-    print(products_df['category'].value_counts())
-    
-    print(f"\nPrice range by category:")
-    price_summary = products_df.groupby('category')['price_per_unit'].agg(['min', 'max', 'mean']).round(2)
-    print(price_summary)
-    
-    print("\nFiles generated:")
-    print("- users.csv")
-    print("- products.csv") 
+    print("- products.csv")
     print("- orders.csv")
     print("- order_items.csv")
 
@@ -0,0 +1,61 @@
+"""
+Tiny on-disk cache for LLM responses
+====================================
+
+Product generation reruns the same prompts on every invocation of the
+dataset generator, paying API latency and tokens each time. This module
+memoizes raw response content in a local JSONL file keyed by a SHA-256
+hash of the request's identifying parameters (model, category, batch
+size, prompt version), so repeat runs skip the network entirely.
+
+Usage:
+    key = llm_cache.make_key(model="gpt-4.1-nano", category="Dairy", n=30, prompt_v=1)
+    content = llm_cache.get(key)
+    if content is None:
+        content = call_the_api()
+        llm_cache.set(key, content)
+"""
+
+import hashlib
+import json
+import os
+
+CACHE_PATH = os.path.join(os.path.dirname(__file__), '.cache', 'products.jsonl')
+
+_cache = None
+
+
+def _load():
+    """Read the cache file into memory once per process"""
+    global _cache
+    if _cache is None:
+        _cache = {}
+        if os.path.exists(CACHE_PATH):
+            with open(CACHE_PATH) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Skip partially written lines
+                    _cache[entry['key']] = entry['value']
+    return _cache
+
+
+def make_key(**params):
+    """Build a stable SHA-256 key from the request's parameters"""
+    payload = json.dumps(params, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get(key):
+    """Return the cached value for key, or None on a miss"""
+    return _load().get(key)
+
+
+def set(key, value):
+    """Store value under key, appending it to the cache file"""
+    cache = _load()
+    cache[key] = value
+    os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+    with open(CACHE_PATH, 'a') as f:
+        f.write(json.dumps({'key': key, 'value': value}) + '\n')